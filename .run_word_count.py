@@ -1,8 +1,8 @@
 # word_count.py
 def count_words(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        text = f.read()
-    return sum(1 for tok in text.split() if tok.strip())
+    # bytes.split() skips the Unicode whitespace scan and already drops empty tokens
+    with open(file_path, "rb") as f:
+        return len(f.read().split())
 
 
 if __name__ == "__main__":
@@ -13,11 +13,11 @@ Notes:
 
 import os
 import sys
-import json
+import orjson
 import argparse
 import re
 import unicodedata
-from typing import List, Dict, Any
+from typing import Dict, Any, Iterator
 from dotenv import load_dotenv
 
 # Requires: pip install openai>=1.40.0
@@ -112,25 +112,24 @@ EXPECTED_SCHEMA = {
     },
 }
 
+# hyphen+newline (de-hyphenate) or any whitespace run, handled in one pass
+_WS_RE = re.compile(r"-\s*\n\s*|\s+")
+_TRANS = str.maketrans("", "", "\u00AD")  # drop soft hyphens
+
+def _ws_sub(m: re.Match) -> str:
+    return "" if m.group(0)[0] == "-" else " "
+
 def normalize_text(text: str) -> str:
-    t = unicodedata.normalize("NFKC", text).replace("\u00AD", "")
-    # de-hyphenate across newlines
-    t = re.sub(r"-\s*\n\s*", "", t)
-    # replace all newlines with single spaces
-    t = re.sub(r"\s*\n\s*", " ", t)
-    # collapse whitespace
-    t = re.sub(r"\s+", " ", t).strip()
-    return t
-
-def chunk_text(text: str, max_chars: int) -> List[str]:
+    t = unicodedata.normalize("NFKC", text).translate(_TRANS)
+    return _WS_RE.sub(_ws_sub, t).strip()
+
+def chunk_text(text: str, max_chars: int) -> Iterator[str]:
+    # lazy: only one slice alive at a time
     if len(text) <= max_chars:
-        return [text]
-    chunks = []
-    i = 0
-    while i < len(text):
-        chunks.append(text[i:i+max_chars])
-        i += max_chars
-    return chunks
+        yield text
+        return
+    for i in range(0, len(text), max_chars):
+        yield text[i:i+max_chars]
 
 def make_user_prompt(meta: Dict[str, Any], text: str) -> str:
     return (
@@ -196,7 +195,6 @@ def main():
         raw = f.read()
 
     text = normalize_text(raw)
-    chunks = chunk_text(text, args.max_chars)
 
     meta = {
         "title": args.title,
@@ -209,12 +207,12 @@ def main():
         "pdf_url": args.pdf_url,
     }
 
-    # Combine chunks into one message for now (you can do multi-turn later if needed)
-    content = make_user_prompt(meta, "\n\n".join(chunks))
+    # Single call: send the text as-is. chunk_text (--max-chars) is kept for a future multi-turn flow.
+    content = make_user_prompt(meta, text)
 
     client = OpenAI(api_key=api_key)
 
-    print(f"> Calling model={args.model} on {args.file} (chars={len(text)}, chunks={len(chunks)})...")
+    print(f"> Calling model={args.model} on {args.file} (chars={len(text)})...")
     resp = client.responses.create(
         model=args.model,
         input=[
@@ -230,7 +228,7 @@ def main():
         first_brace = output_text.find("{")
         last_brace = output_text.rfind("}")
         json_text = output_text[first_brace:last_brace+1]
-        data = json.loads(json_text)
+        data = orjson.loads(json_text)
     except Exception as e:
         print("Raw model output (truncated to 1k chars):")
         print(output_text[:1000])
@@ -250,8 +248,8 @@ def main():
     data["provenance"].setdefault("summary_prompt_version", "v1")
 
     # Write output
-    with open(args.out, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    with open(args.out, "wb") as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
     print(f"✅ Wrote {args.out} | valid_shape={ok}")
     # Pretty-print TL;DR for convenience
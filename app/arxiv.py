@@ -1,57 +1,107 @@
 # app/arxiv.py
 # fetch + parse arXiv data
-import httpx
-import xml.etree.ElementTree as ET
-from datetime import datetime
+import logging
+import os
+import time
+from lxml import etree
+from datetime import datetime, timezone
+
+from app.http_client import get_http_client
+
+logger = logging.getLogger(__name__)
 
 ARXIV_API_URL = "https://export.arxiv.org/api/query"
 
+# Feed cache: (start_date, end_date, start, max_results) -> etag/last-modified/entries.
+# Ranges that ended before today are immutable; ranges touching today are
+# served from memory for ARXIV_FEED_TTL seconds, then revalidated conditionally.
+ARXIV_FEED_TTL = int(os.getenv("ARXIV_FEED_TTL", str(6 * 3600)))
+FEED_CACHE_MAX = 128
+_feed_cache: dict[tuple, dict] = {}
+
+# Clark-notation tags ({namespace}local) so find() skips prefix resolution
+_ATOM = "{http://www.w3.org/2005/Atom}"
+_ARXIV = "{http://arxiv.org/schemas/atom}"
+_TAG_ENTRY = _ATOM + "entry"
+_TAG_ID = _ATOM + "id"
+_TAG_TITLE = _ATOM + "title"
+_TAG_SUMMARY = _ATOM + "summary"
+_TAG_PUBLISHED = _ATOM + "published"
+_TAG_UPDATED = _ATOM + "updated"
+_TAG_AUTHOR = _ATOM + "author"
+_TAG_NAME = _ATOM + "name"
+_TAG_LINK = _ATOM + "link"
+_TAG_CATEGORY = _ATOM + "category"
+_TAG_PRIMARY_CATEGORY = _ARXIV + "primary_category"
+
+
+def _range_is_closed(end_date: str) -> bool:
+    # dates are YYYYMMDDHHMM; anything ending before today won't change
+    return end_date[:8] < datetime.now(timezone.utc).strftime("%Y%m%d")
+
 
 async def fetch_arxiv_papers(
     start_date: str, end_date: str, start: int = 0, max_results: int = 100
 ):
+    key = (start_date, end_date, start, max_results)
+    cached = _feed_cache.get(key)
+    if cached and (
+        _range_is_closed(end_date) or time.monotonic() - cached["ts"] < ARXIV_FEED_TTL
+    ):
+        return cached["entries"]
+
     query = f"submittedDate:[{start_date} TO {end_date}]"
     params = {
         "search_query": query,
         "start": start,
         "max_results": max_results,
     }
+    headers = {}
+    if cached and cached["etag"]:
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached["last_modified"]:
+        headers["If-Modified-Since"] = cached["last_modified"]
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(ARXIV_API_URL, params=params)
-        response.raise_for_status()
-        return parse_arxiv_xml(response.text)
-
+    response = await get_http_client().get(ARXIV_API_URL, params=params, headers=headers)
+    if response.status_code == 304 and cached:
+        cached["ts"] = time.monotonic()
+        return cached["entries"]
+    response.raise_for_status()
+    entries = parse_arxiv_xml(response.content)
 
-def parse_arxiv_xml(xml_data: str):
-    ns = {
-        "atom": "http://www.w3.org/2005/Atom",
-        "arxiv": "http://arxiv.org/schemas/atom",
+    if key not in _feed_cache and len(_feed_cache) >= FEED_CACHE_MAX:
+        _feed_cache.pop(next(iter(_feed_cache)))  # drop the oldest entry
+    _feed_cache[key] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "entries": entries,
+        "ts": time.monotonic(),
     }
-    root = ET.fromstring(xml_data)
-    entries = []
+    return entries
 
-    for entry in root.findall("atom:entry", ns):
-        arxiv_id = entry.find("atom:id", ns).text.split("/")[-1]
-        title = entry.find("atom:title", ns).text.strip()
-        # summary = entry.find("atom:summary", ns).text.strip()
-        summary = "".join(entry.find("atom:summary", ns).itertext()).strip()
 
-        import sys
+def parse_arxiv_xml(xml_data: bytes | str):
+    # lxml rejects str input that carries an encoding declaration
+    if isinstance(xml_data, str):
+        xml_data = xml_data.encode("utf-8")
+    root = etree.fromstring(xml_data)
+    entries = []
 
-        print("RAW:", entry.find("atom:summary", ns).text, file=sys.stderr)
-        print("FULL:", "".join(entry.find("atom:summary", ns).itertext()).strip())
+    for entry in root.iterchildren(_TAG_ENTRY):
+        arxiv_id = entry.find(_TAG_ID).text.split("/")[-1]
+        title = entry.find(_TAG_TITLE).text.strip()
+        summary_el = entry.find(_TAG_SUMMARY)
+        summary = "".join(summary_el.itertext()).strip()
+        logger.debug("arxiv %s summary: %s", arxiv_id, summary)
 
-        published_raw = entry.find("atom:published", ns).text
-        updated_raw = entry.find("atom:updated", ns).text
+        published_raw = entry.find(_TAG_PUBLISHED).text
+        updated_raw = entry.find(_TAG_UPDATED).text
         published = datetime.fromisoformat(published_raw.replace("Z", "+00:00"))
         updated = datetime.fromisoformat(updated_raw.replace("Z", "+00:00"))
 
-        authors = [
-            a.find("atom:name", ns).text for a in entry.findall("atom:author", ns)
-        ]
+        authors = [a.find(_TAG_NAME).text for a in entry.iterchildren(_TAG_AUTHOR)]
 
-        links = entry.findall("atom:link", ns)
+        links = entry.iterchildren(_TAG_LINK)
         url = None
         pdf_url = None
         for link in links:
@@ -61,8 +111,8 @@ def parse_arxiv_xml(xml_data: str):
                 url = link.attrib["href"]
 
         # Primary and all categories
-        primary_category = entry.find("arxiv:primary_category", ns).attrib["term"]
-        all_categories = [c.attrib["term"] for c in entry.findall("atom:category", ns)]
+        primary_category = entry.find(_TAG_PRIMARY_CATEGORY).attrib["term"]
+        all_categories = [c.attrib["term"] for c in entry.iterchildren(_TAG_CATEGORY)]
 
         entries.append(
             {
@@ -0,0 +1,276 @@
+# app/batch_summarizer.py
+# Bulk summarization through the OpenAI Batch API (~50% cheaper, results within 24h)
+import asyncio, io, time, uuid
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Tuple
+
+import orjson
+from sqlmodel import Session, select, update
+
+from app.db import engine
+from app.models import ArxivPaper
+from app.summarize_runner import _paper_meta, _save
+from app.summarizer import (
+    SUMMARY_MODEL,
+    SummarizationResult,
+    client,
+    prepare_pdf_text,
+    _build_input,
+    _get_cached_summary,
+    _put_cached_summary,
+    _store_summary,
+)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+# Batch API input-file limits are 200 MB and 50,000 requests; stay under the size
+# with some headroom and start a new batch when either would be exceeded.
+BATCH_MAX_BYTES = 190 * 1024 * 1024
+BATCH_MAX_REQUESTS = 50_000
+# Papers per /cron/summarize/batch call: every PDF is downloaded and extracted
+# in one background run, and ~2000 papers of typical size fit in one batch.
+SUBMIT_MAX_PAPERS = 2000
+# Rows are claimed (summary_batch_id = "claim:<epoch>:<uuid>") before any download,
+# so overlapping submits and summarize_missing_papers skip them. Claims left behind
+# by a crashed submit are released after CLAIM_TTL seconds.
+CLAIM_PREFIX = "claim:"
+CLAIM_TTL = 6 * 3600
+
+# summarizer.client retries through its rate limiter; plain SDK retries are fine here
+batch_client = client.with_options(max_retries=2)
+
+
+def _batch_line(p: ArxivPaper, text: str, text_hash: str) -> bytes:
+    return orjson.dumps(
+        {
+            # text hash rides along so poll can fill SummaryCache
+            "custom_id": f"{p.arxiv_id}|{text_hash}",
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": SUMMARY_MODEL,
+                "messages": _build_input(_paper_meta(p), text),
+                "temperature": 0,
+                "response_format": {"type": "json_object"},
+            },
+        }
+    )
+
+
+def _claim_pending(limit: int) -> Tuple[str, List[ArxivPaper]]:
+    now = int(time.time())
+    claim = f"{CLAIM_PREFIX}{now:010d}:{uuid.uuid4().hex}"
+    with Session(engine) as session:
+        # fixed-width epoch: string order is time order
+        session.exec(
+            update(ArxivPaper)
+            .where(ArxivPaper.summary_batch_id.startswith(CLAIM_PREFIX))
+            .where(ArxivPaper.summary_batch_id < f"{CLAIM_PREFIX}{now - CLAIM_TTL:010d}")
+            .values(summary_batch_id=None)
+        )
+        ids = session.exec(
+            select(ArxivPaper.id)
+            .where(ArxivPaper.llm_summary.is_(None))
+            .where(ArxivPaper.summary_batch_id.is_(None))
+            .where(ArxivPaper.pdf_url.is_not(None))
+            .order_by(ArxivPaper.published.desc())
+            .limit(limit)
+        ).all()
+        # conditional UPDATE: rows another submit claimed in between are skipped
+        session.exec(
+            update(ArxivPaper)
+            .where(ArxivPaper.id.in_(ids))
+            .where(ArxivPaper.summary_batch_id.is_(None))
+            .values(summary_batch_id=claim)
+        )
+        session.commit()
+        papers = session.exec(
+            select(ArxivPaper)
+            .where(ArxivPaper.summary_batch_id == claim)
+            .order_by(ArxivPaper.published.desc())
+        ).all()
+    return claim, papers
+
+
+def _release_claim(claim: str) -> None:
+    # whatever didn't make it into a batch (failed download, upload error) is eligible again
+    with Session(engine) as session:
+        session.exec(
+            update(ArxivPaper)
+            .where(ArxivPaper.summary_batch_id == claim)
+            .values(summary_batch_id=None, summary_pdf_sha256=None)
+        )
+        session.commit()
+
+
+async def _submit(lines: List[bytes], papers: List[ArxivPaper]) -> str:
+    payload = b"\n".join(lines) + b"\n"
+    batch_file = await batch_client.files.create(
+        file=("summaries.jsonl", io.BytesIO(payload)), purpose="batch"
+    )
+    batch = await batch_client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+    )
+    for p in papers:
+        p.summary_batch_id = batch.id
+    return batch.id
+
+
+async def submit_summary_batch(limit: int = 500) -> Dict[str, Any]:
+    """Claim pending papers, download/extract them and submit one or more batches.
+
+    Long-running: call it from a background task, not inside a request.
+    """
+    # no DB connection is held across the downloads and uploads below
+    claim, papers = await asyncio.to_thread(_claim_pending, limit)
+
+    batch_ids: List[str] = []
+    dirty: List[ArxivPaper] = []  # reused, not yet written back
+    lines: List[bytes] = []
+    queued: List[ArxivPaper] = []
+    size = n_queued = reused = 0
+
+    async def flush() -> None:
+        nonlocal lines, queued, size
+        batch_ids.append(await _submit(lines, queued))
+        # record the batch id right away so a later failure can't orphan it
+        await asyncio.to_thread(_save, dirty + queued)
+        dirty.clear()
+        lines, queued, size = [], [], 0
+
+    try:
+        for p in papers:
+            try:
+                prepared = await prepare_pdf_text(p.pdf_url)
+            except Exception as e:
+                print(f"[submit_summary_batch] {p.id or p.title} failed: {e}")
+                continue
+            p.summary_pdf_sha256 = prepared.pdf_sha256
+
+            if prepared.summary is not None:
+                cached = prepared.summary.summary_text
+            else:
+                cached = await asyncio.to_thread(_get_cached_summary, prepared.text_sha256)
+            if cached is not None:
+                p.llm_summary = cached
+                p.summary_model = SUMMARY_MODEL
+                p.summary_updated_at = datetime.now(timezone.utc)
+                p.summary_batch_id = None
+                dirty.append(p)
+                reused += 1
+                continue
+
+            line = _batch_line(p, prepared.text, prepared.text_sha256 or "")
+            if queued and (size + len(line) + 1 > BATCH_MAX_BYTES or len(queued) >= BATCH_MAX_REQUESTS):
+                await flush()
+            lines.append(line)
+            queued.append(p)
+            size += len(line) + 1
+            n_queued += 1
+
+        if queued:
+            await flush()
+        elif dirty:
+            await asyncio.to_thread(_save, dirty)
+    finally:
+        await asyncio.to_thread(_release_claim, claim)
+    return {"batch_ids": batch_ids, "queued": n_queued, "reused": reused}
+
+
+def _parse_output(raw: bytes) -> Dict[str, Tuple[str, str]]:
+    """arxiv_id -> (model output text, text hash), for successful lines only."""
+    out: Dict[str, Tuple[str, str]] = {}
+    for line in raw.splitlines():
+        if not line.strip():
+            continue
+        row = orjson.loads(line)
+        resp = row.get("response") or {}
+        if row.get("error") or resp.get("status_code") != 200:
+            continue
+        choices = resp["body"].get("choices") or []
+        # "length" means the JSON was truncated: treat the line as failed
+        if choices and choices[0].get("finish_reason") == "stop":
+            arxiv_id, _, text_hash = row["custom_id"].partition("|")
+            out[arxiv_id] = (choices[0]["message"]["content"], text_hash)
+    return out
+
+
+def _list_pending_batches() -> List[str]:
+    with Session(engine) as session:
+        return session.exec(
+            select(ArxivPaper.summary_batch_id)
+            .where(ArxivPaper.summary_batch_id.is_not(None))
+            .where(ArxivPaper.summary_batch_id.not_like(f"{CLAIM_PREFIX}%"))
+            .where(ArxivPaper.llm_summary.is_(None))
+            .distinct()
+        ).all()
+
+
+def _write_batch_results(batch_id: str, outputs: Dict[str, Tuple[str, str]]) -> Tuple[int, int]:
+    written = released = 0
+    results: List[SummarizationResult] = []
+    # one transaction per batch
+    with Session(engine) as session:
+        papers = session.exec(
+            select(ArxivPaper)
+            .where(ArxivPaper.summary_batch_id == batch_id)
+            .where(ArxivPaper.llm_summary.is_(None))
+        ).all()
+        now = datetime.now(timezone.utc)
+        for p in papers:
+            if p.arxiv_id in outputs:
+                summary_text, text_hash = outputs[p.arxiv_id]
+                p.llm_summary = summary_text
+                p.summary_model = SUMMARY_MODEL
+                p.summary_updated_at = now
+                if p.summary_pdf_sha256:
+                    results.append(
+                        SummarizationResult(
+                            summary_text=summary_text,
+                            summary_model=SUMMARY_MODEL,
+                            summary_updated_at=now,
+                            summary_pdf_sha256=p.summary_pdf_sha256,
+                            extracted_text_sha256=text_hash or None,
+                        )
+                    )
+                written += 1
+            else:
+                # failed/expired line: make the paper eligible again
+                p.summary_batch_id = None
+                p.summary_pdf_sha256 = None
+                released += 1
+            session.add(p)
+        session.commit()
+
+    # same tiers the realtime path reads, so it never pays for these PDFs again
+    for res in results:
+        _store_summary(res)
+        _put_cached_summary(res.extracted_text_sha256, res.summary_text)
+    return written, released
+
+
+async def poll_summary_batches() -> Dict[str, Any]:
+    """Check pending batches; store finished summaries and release failed papers."""
+    batch_ids = await asyncio.to_thread(_list_pending_batches)
+
+    written = released = 0
+    pending: List[str] = []
+    for batch_id in batch_ids:
+        batch = await batch_client.batches.retrieve(batch_id)
+        if batch.status not in TERMINAL_STATUSES:
+            pending.append(batch_id)
+            continue
+
+        outputs: Dict[str, Tuple[str, str]] = {}
+        if batch.output_file_id:
+            content = await batch_client.files.content(batch.output_file_id)
+            outputs = _parse_output(content.content)
+
+        w, r = await asyncio.to_thread(_write_batch_results, batch_id, outputs)
+        written += w
+        released += r
+
+    return {"summaries_written": written, "released": released, "pending": pending}
@@ -0,0 +1,43 @@
+# app/cache.py
+# On-disk, content-addressed cache of extracted PDF text.
+# Layout: {TEXT_CACHE_DIR}/{namespace}/{hash[:2]}/{hash}.txt.zst
+# The namespace is the extractor name+version, so upgrading it invalidates old entries.
+import os, threading
+from typing import Optional
+
+import zstandard
+
+TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", "cache/text")
+ZSTD_LEVEL = 3
+
+
+def _path(pdf_hash: str, namespace: str) -> str:
+    return os.path.join(TEXT_CACHE_DIR, namespace, pdf_hash[:2], f"{pdf_hash}.txt.zst")
+
+
+def get_text(pdf_hash: str, namespace: str) -> Optional[str]:
+    try:
+        with open(_path(pdf_hash, namespace), "rb") as f:
+            return zstandard.ZstdDecompressor().decompress(f.read()).decode("utf-8")
+    except FileNotFoundError:
+        return None
+    except (OSError, zstandard.ZstdError, UnicodeDecodeError) as e:
+        print(f"[cache] unreadable entry for {pdf_hash}: {e}")
+        return None
+
+
+def put_text(pdf_hash: str, namespace: str, text: str) -> None:
+    # best-effort like get_text: a cache that can't be written must not fail the caller
+    path = _path(pdf_hash, namespace)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(text.encode("utf-8")))
+        os.replace(tmp, path)  # atomic: readers never see a partial file
+    except (OSError, zstandard.ZstdError) as e:
+        print(f"[cache] could not write entry for {pdf_hash}: {e}")
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
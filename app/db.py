@@ -1,41 +1,86 @@
 # DB connection & save logic
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event, insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from app.models import ArxivPaper, Category
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 DATABASE_URL = os.getenv("DATABASE_URL")
-engine = create_engine(DATABASE_URL, echo=True)
+# SQL logging is expensive on bulk inserts; opt in with SQL_ECHO=1
+engine = create_engine(
+    DATABASE_URL,
+    echo=os.getenv("SQL_ECHO", "0") == "1",
+    pool_pre_ping=True,
+    pool_size=int(os.getenv("DB_POOL_SIZE", "20")),
+    max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
+)
+
+if engine.dialect.name == "sqlite":
+    # SQLite ignores foreign keys unless asked per connection; the vote/bookmark
+    # inserts rely on the paper_id FK to reject unknown papers
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_fks(dbapi_conn, _record):
+        dbapi_conn.execute("PRAGMA foreign_keys=ON")
 
 
 def init_db():
     SQLModel.metadata.create_all(engine)
 
 
+def get_session():
+    """FastAPI dependency: one pooled Session per request, closed when the response is sent."""
+    with Session(engine) as session:
+        yield session
+
+
+def dialect_insert(model):
+    """INSERT construct that supports ON CONFLICT for the configured backend."""
+    if engine.dialect.name == "postgresql":
+        return pg_insert(model)
+    return sqlite_insert(model)
+
+
 def save_papers(papers: list[dict]):
+    if not papers:
+        return
+    # dedupe within this feed; existing rows are skipped by ON CONFLICT
+    by_id = {p["arxiv_id"]: p for p in papers}
+    rows = [
+        {
+            "arxiv_id": paper["arxiv_id"],
+            "title": paper["title"],
+            "summary": paper["summary"],
+            "published": paper["published"],
+            "updated": paper["updated"],
+            "authors": ", ".join(paper["authors"]),
+            "url": paper["url"],
+            "pdf_url": paper["pdf_url"],
+        }
+        for paper in by_id.values()
+    ]
+
     with Session(engine) as session:
-        for paper in papers:
-            if session.query(ArxivPaper).filter_by(arxiv_id=paper["arxiv_id"]).first():
-                continue
-            new_paper = ArxivPaper(
-                arxiv_id=paper["arxiv_id"],
-                title=paper["title"],
-                summary=paper["summary"],
-                published=paper["published"],
-                updated=paper["updated"],
-                authors=", ".join(paper["authors"]),
-                url=paper["url"],
-                pdf_url=paper["pdf_url"],
-            )
-
-            # Add category entries
-            categories = []
-            for cat in paper["all_categories"]:
-                categories.append(
-                    Category(term=cat, is_primary=(cat == paper["primary_category"]))
-                )
-            new_paper.categories = categories
-
-            session.add(new_paper)
+        stmt = (
+            dialect_insert(ArxivPaper)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["arxiv_id"])
+            .returning(ArxivPaper.id, ArxivPaper.arxiv_id)
+        )
+        inserted = session.exec(stmt).all()  # only rows that were actually new
+
+        # Add category entries for the new papers
+        categories = [
+            {
+                "term": cat,
+                "is_primary": cat == by_id[arxiv_id]["primary_category"],
+                "paper_id": paper_id,
+            }
+            for paper_id, arxiv_id in inserted
+            for cat in by_id[arxiv_id]["all_categories"]
+        ]
+        if categories:
+            session.exec(insert(Category), params=categories)
         session.commit()
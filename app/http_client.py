@@ -0,0 +1,29 @@
+# app/http_client.py
+# One shared httpx client for the app's lifetime: keep-alive + HTTP/2 to arxiv.org
+# instead of a fresh TCP/TLS handshake per request.
+import os
+
+import httpx
+
+# Sized for concurrent PDF downloads; with HTTP/2 many requests share one connection.
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+
+_client = httpx.AsyncClient(
+    http2=True,
+    timeout=60,
+    follow_redirects=True,
+    limits=httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+    ),
+    headers={"User-Agent": "ResearchTLDR/1.0 (+https://researchtldr.com)"},
+)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    return _client
+
+
+async def close_http_client() -> None:
+    await _client.aclose()
@@ -3,7 +3,11 @@ from sqlmodel import SQLModel, Field, Relationship, UniqueConstraint
 from sqlalchemy import Column
 from sqlalchemy.types import JSON
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
 
 
 class Category(SQLModel, table=True):
@@ -16,10 +20,10 @@ class Category(SQLModel, table=True):
 
 class ArxivPaper(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    arxiv_id: str
+    arxiv_id: str = Field(index=True, unique=True)
     title: str
     summary: str
-    published: datetime
+    published: datetime = Field(index=True)  # backs order_by(published.desc())
     published_raw: Optional[str] = None
     updated: datetime
     updated_raw: Optional[str] = None
@@ -33,13 +37,50 @@ class ArxivPaper(SQLModel, table=True):
     summary_model: Optional[str] = None
     summary_pdf_sha256: Optional[str] = Field(default=None, index=True)
     summary_updated_at: Optional[datetime] = None
+    summary_batch_id: Optional[str] = Field(default=None, index=True)  # pending OpenAI batch
+
+
+class PaperListItem(SQLModel):
+    """Slim paper row for list endpoints; the columns /arxiv/show selects."""
+    id: int
+    arxiv_id: str
+    title: str
+    authors: str
+    published: datetime
+    url: str
+
+
+class SummaryCache(SQLModel, table=True):
+    # key = sha256(extracted_text_sha256|summary_model|summary_prompt_version)
+    key: str = Field(primary_key=True)
+    summary_json: str
+    created_at: datetime = Field(default_factory=_utcnow)
+
+
+class Summary(SQLModel, table=True):
+    # one stored summary per (PDF, model, prompt): lets any worker skip extraction + LLM
+    id: Optional[int] = Field(default=None, primary_key=True)
+    summary_pdf_sha256: str = Field(index=True)
+    summary_model: str
+    summary_prompt_version: str
+    summary_json: str
+    extracted_text_sha256: Optional[str] = None
+    created_at: datetime = Field(default_factory=_utcnow)
+    __table_args__ = (
+        UniqueConstraint(
+            "summary_pdf_sha256",
+            "summary_model",
+            "summary_prompt_version",
+            name="uq_summary_pdf_model_prompt",
+        ),
+    )
 
 
 class UserSettings(SQLModel, table=True):
     user_sub: str = Field(primary_key=True, foreign_key="user.sub")
     # map dict -> JSON column
     prefs: dict = Field(sa_column=Column(JSON, nullable=False, server_default="{}"))
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
 
 
 class User(SQLModel, table=True):
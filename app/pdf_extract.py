@@ -0,0 +1,125 @@
+# app/pdf_extract.py
+# PDF -> text. Kept free of app imports (DB, OpenAI, HTTP): the page pool's spawn
+# workers import this module, and it should cost them no more than fitz/pypdf.
+import io, multiprocessing, os, threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Optional, BinaryIO, Union
+
+import pypdf
+from pypdf import PdfReader
+try:
+    import fitz  # PyMuPDF: C-backed, much faster than pypdf
+except ImportError:
+    fitz = None
+
+if fitz is not None:
+    EXTRACTION_TOOL = "pymupdf"
+    EXTRACTION_TOOL_VERSION = fitz.VersionBind
+else:
+    EXTRACTION_TOOL = "pypdf"
+    EXTRACTION_TOOL_VERSION = pypdf.__version__
+
+
+def _default_workers() -> int:
+    # CPUs this process may run on (not the host's count), capped: each worker is
+    # a separate interpreter and long papers rarely split usefully beyond a few
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    return min(4, cpus)
+
+
+# per-page extraction is spread over worker processes for long papers
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(_default_workers())))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+_page_pool: Optional[ProcessPoolExecutor] = None
+_page_pool_lock = threading.Lock()
+
+
+def _extract_pages(pdf: Union[bytes, BinaryIO], start: int, stop: int) -> str:
+    # Module-level so it can run in a worker process; each call opens its own document.
+    # Pages are streamed into one buffer ("\n\n" between pages) instead of a list + join.
+    buf = io.StringIO()
+    if fitz is not None:
+        try:
+            with fitz.open(stream=pdf, filetype="pdf") as doc:
+                for i in range(start, stop):
+                    if i > start:
+                        buf.write("\n\n")
+                    buf.write(doc[i].get_text("text"))
+            return buf.getvalue()
+        except Exception as e:
+            print(f"[extract] pymupdf failed, falling back to pypdf: {e}")
+            buf = io.StringIO()
+    stream = io.BytesIO(pdf) if isinstance(pdf, bytes) else pdf
+    stream.seek(0)
+    pages = PdfReader(stream).pages
+    for i in range(start, stop):
+        if i > start:
+            buf.write("\n\n")
+        try:
+            buf.write(pages[i].extract_text() or "")
+        except Exception:
+            pass
+    return buf.getvalue()
+
+
+def _page_count(pdf: BinaryIO) -> int:
+    if fitz is not None:
+        try:
+            with fitz.open(stream=pdf, filetype="pdf") as doc:
+                return doc.page_count
+        except Exception:
+            pdf.seek(0)
+    return len(PdfReader(pdf).pages)
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # spawn: we're called from worker threads, where fork is unsafe
+            _page_pool = ProcessPoolExecutor(
+                max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _page_pool
+
+
+def _drop_page_pool(pool: ProcessPoolExecutor) -> None:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_page_pool() -> None:
+    """Stop the worker processes (app shutdown/reload)."""
+    pool = _page_pool
+    if pool is not None:
+        _drop_page_pool(pool)
+
+
+def extract_text(pdf: BinaryIO) -> str:
+    n_pages = _page_count(pdf)
+    if PDF_EXTRACT_WORKERS <= 1 or n_pages < PDF_PARALLEL_MIN_PAGES:
+        return _extract_pages(pdf, 0, n_pages)
+    # one contiguous page range per worker, reassembled in order
+    step = -(-n_pages // PDF_EXTRACT_WORKERS)
+    starts = range(0, n_pages, step)
+    stops = [min(i + step, n_pages) for i in starts]
+    data = pdf.getvalue()
+    for attempt in range(2):
+        pool = _get_page_pool()
+        try:
+            return "\n\n".join(pool.map(partial(_extract_pages, data), starts, stops))
+        except BrokenProcessPool:
+            # a worker died (segfault/OOM kill); a dead pool would fail every long
+            # paper until restart, so replace it and retry once on a fresh one
+            _drop_page_pool(pool)
+            if attempt:
+                raise
+            print("[extract] page pool broken, restarting it")
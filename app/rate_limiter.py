@@ -0,0 +1,45 @@
+# app/rate_limiter.py
+# Request/token budget for OpenAI calls, modelled on the cookbook's
+# api_request_parallel_processor: both capacities refill continuously over time.
+import asyncio, time
+
+
+class AsyncRateLimiter:
+    def __init__(self, rpm: float, tpm: float):
+        self.max_requests_per_minute = rpm
+        self.max_tokens_per_minute = tpm
+        self.available_request_capacity = rpm
+        self.available_token_capacity = tpm
+        self.last_update = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self.last_update
+        self.available_request_capacity = min(
+            self.available_request_capacity + self.max_requests_per_minute * elapsed / 60.0,
+            self.max_requests_per_minute,
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60.0,
+            self.max_tokens_per_minute,
+        )
+        self.last_update = now
+
+    async def acquire(self, est_tokens: int) -> None:
+        # a single call larger than the whole budget would wait forever
+        est_tokens = min(est_tokens, self.max_tokens_per_minute)
+        while True:
+            self._refill()
+            if (
+                self.available_request_capacity >= 1
+                and self.available_token_capacity >= est_tokens
+            ):
+                self.available_request_capacity -= 1
+                self.available_token_capacity -= est_tokens
+                return
+            await asyncio.sleep(0.001)
+
+
+def estimate_tokens(text: str, max_output_tokens: int) -> int:
+    # ~4 chars per token for English prose
+    return len(text) // 4 + max_output_tokens
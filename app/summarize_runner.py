@@ -1,50 +1,102 @@
 # app/summarize_runner.py
+import asyncio, os
+from typing import Any, Dict, List
 from sqlmodel import Session, select
 from app.db import engine
 from app.models import ArxivPaper
-from app.summarizer import summarize_pdf_url_to_json
+from app.summarizer import prepare_pdf_text, summarize_prepared
 
-async def summarize_missing_papers(limit: int = 10) -> int:
-    updated = 0
+MAX_CONCURRENT = int(os.getenv("SUMMARY_MAX_CONCURRENT", "8"))
+# PDFs downloaded + extracted ahead of the LLM workers
+PREFETCH = int(os.getenv("SUMMARY_PREFETCH", "2"))
+# concurrent PDF downloads; kept small to stay polite to arxiv.org
+DOWNLOAD_CONCURRENCY = int(os.getenv("SUMMARY_DOWNLOAD_CONCURRENCY", "2"))
+
+def _paper_meta(p: ArxivPaper) -> Dict[str, Any]:
+    return {
+        "title": p.title,
+        "authors": p.authors.split(",") if p.authors else [],
+        "venue": "",         # arXiv doesn’t provide; keep blank
+        "year": p.published.year if p.published else None,
+        "doi": "",           # if you store DOI, put it here
+        "arxiv_id": p.arxiv_id,
+        "url": p.url,
+        "pdf_url": p.pdf_url,
+    }
+
+def _load_missing(limit: int) -> List[ArxivPaper]:
     with Session(engine) as session:
         q = (
             select(ArxivPaper)
             .where((ArxivPaper.llm_summary.is_(None)) | (ArxivPaper.summary_pdf_sha256.is_(None)))
+            .where(ArxivPaper.summary_batch_id.is_(None))  # owned by batch_summarizer
             .order_by(ArxivPaper.published.desc())
             .limit(limit)
         )
-        papers = session.exec(q).all()
+        return [p for p in session.exec(q).all() if not p.summary_pdf_sha256]  # skip already-summarized PDFs
+
+def _save(papers: List[ArxivPaper]) -> None:
+    # rows were loaded in an earlier session; their attribute changes are still tracked
+    with Session(engine) as session:
+        session.add_all(papers)
+        session.commit()
 
-        for p in papers:
-            if p.summary_pdf_sha256:  # already summarized this exact PDF
+async def summarize_missing_papers(limit: int = 10, max_concurrent: int = MAX_CONCURRENT) -> int:
+    # short sessions in worker threads: no connection sits idle-in-transaction
+    # across the downloads and LLM calls, and the event loop never blocks on the DB
+    papers = await asyncio.to_thread(_load_missing, limit)
+    metas = [_paper_meta(p) for p in papers]
+
+    # Producers download/extract PDFs (bounded prefetch) while workers run LLM calls,
+    # so the next paper is ready as soon as a worker frees up.
+    queue: asyncio.Queue = asyncio.Queue(maxsize=PREFETCH)
+    results: Dict[int, Any] = {}
+    n_workers = max(1, min(max_concurrent, len(papers)))
+    n_producers = max(1, min(DOWNLOAD_CONCURRENCY, len(papers)))
+    todo = iter(enumerate(papers))  # shared: each producer takes the next paper
+
+    async def produce():
+        for i, p in todo:
+            try:
+                prepared = await prepare_pdf_text(p.pdf_url)
+            except Exception as e:
+                results[i] = e
                 continue
+            await queue.put((i, prepared))
+
+    async def produce_all():
+        await asyncio.gather(*(produce() for _ in range(n_producers)))
+        for _ in range(n_workers):
+            await queue.put(None)
 
+    async def consume():
+        while (item := await queue.get()) is not None:
+            i, prepared = item
             try:
-                meta = {
-                    "title": p.title,
-                    "authors": p.authors.split(",") if p.authors else [],
-                    "venue": "",         # arXiv doesn’t provide; keep blank
-                    "year": p.published.year if p.published else None,
-                    "doi": "",           # if you store DOI, put it here
-                    "arxiv_id": p.arxiv_id,
-                    "url": p.url,
-                    "pdf_url": p.pdf_url,
-                }
-                res = await summarize_pdf_url_to_json(p.pdf_url, meta)
-
-                p.llm_summary = res.summary_text         # store JSON string
-                p.summary_model = res.summary_model
-                p.summary_updated_at = res.summary_updated_at
-                p.summary_pdf_sha256 = res.summary_pdf_sha256
-
-                # optional provenance if you added columns:
-                if hasattr(p, "extracted_text_sha256"):
-                    p.extracted_text_sha256 = res.extracted_text_sha256
-
-                session.add(p)
-                session.commit()
-                updated += 1
+                results[i] = await summarize_prepared(prepared, metas[i])
             except Exception as e:
-                print(f"[summarize_missing_papers] {p.id or p.title} failed: {e}")
-                session.rollback()
-    return updated
+                results[i] = e
+
+    await asyncio.gather(produce_all(), *(consume() for _ in range(n_workers)))
+
+    # write everything back once the network-bound work is done
+    done = []
+    for i, p in enumerate(papers):
+        res = results[i]
+        if isinstance(res, Exception):
+            print(f"[summarize_missing_papers] {p.id or p.title} failed: {res}")
+            continue
+
+        p.llm_summary = res.summary_text         # store JSON string
+        p.summary_model = res.summary_model
+        p.summary_updated_at = res.summary_updated_at
+        p.summary_pdf_sha256 = res.summary_pdf_sha256
+
+        # optional provenance if you added columns:
+        if hasattr(p, "extracted_text_sha256"):
+            p.extracted_text_sha256 = res.extracted_text_sha256
+
+        done.append(p)
+    if done:
+        await asyncio.to_thread(_save, done)
+    return len(done)
@@ -1,18 +1,44 @@
 # app/summarizer.py
-import io, hashlib, os, re, unicodedata
-from datetime import datetime
-from typing import Optional, Dict, Any, List
+import asyncio, io, hashlib, os, random, re, time, unicodedata
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, List, Tuple, BinaryIO, Callable, Awaitable, TypeVar
 
-import httpx
 from pydantic import BaseModel
-from pypdf import PdfReader
-from openai import OpenAI
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+from openai import AsyncOpenAI, APIConnectionError, APIStatusError
+from sqlmodel import Session, select
+
+from app import cache
+from app.pdf_extract import EXTRACTION_TOOL, EXTRACTION_TOOL_VERSION, extract_text
+from app.http_client import get_http_client
+from app.db import engine, dialect_insert
+from app.models import Summary, SummaryCache
+from app.rate_limiter import AsyncRateLimiter, estimate_tokens
 
 SUMMARY_MODEL = "gpt-4o-mini"
 PROMPT_PATH = os.getenv("SUMMARY_PROMPT_PATH", "app/prompts/summarize_v1.txt")
-MAX_CHARS_PER_CHUNK = int(os.getenv("SUMMARY_MAX_CHARS_PER_CHUNK", "6000"))
+# read once at import: no file I/O on the summarization path
+with open(PROMPT_PATH, "r", encoding="utf-8") as f:
+    _SYSTEM_PROMPT = f.read()
+SUMMARY_PROMPT_VERSION = os.getenv(
+    "SUMMARY_PROMPT_VERSION", os.path.splitext(os.path.basename(PROMPT_PATH))[0]
+)
+MAX_OUTPUT_TOKENS = int(os.getenv("SUMMARY_MAX_OUTPUT_TOKENS", "2000"))
+MAX_RETRIES = int(os.getenv("SUMMARY_MAX_RETRIES", "5"))
+# gpt-4o-mini's window; the paper text gets what's left after prompt + output
+SUMMARY_CONTEXT_TOKENS = int(os.getenv("SUMMARY_CONTEXT_TOKENS", "128000"))
+PROMPT_OVERHEAD_TOKENS = 2048  # metadata header (bounded in _make_user_prompt) + framing
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# retries are handled in _create_response so they go back through the limiter
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+rate_limiter = AsyncRateLimiter(
+    rpm=float(os.getenv("OPENAI_RPM", "500")),
+    tpm=float(os.getenv("OPENAI_TPM", "200000")),
+)
 
 ARXIV_HOSTS = {"arxiv.org", "www.arxiv.org"}
 
@@ -24,60 +50,123 @@ def _normalize_pdf_url(url: str) -> str:
         return urlunparse(p)
     return url
 
-async def _download_pdf(pdf_url: str) -> bytes:
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+async def _download_pdf(pdf_url: str) -> Tuple[io.BytesIO, str]:
+    """Stream the PDF into one buffer, hashing as it arrives (no second pass/copy)."""
     url = _normalize_pdf_url(pdf_url)
-    async with httpx.AsyncClient(
-        timeout=60, follow_redirects=True,
-        headers={"User-Agent":"ResearchTLDR/1.0 (+https://researchtldr.com)"}
-    ) as http:
-        r = await http.get(url)
+    buf = io.BytesIO()
+    hasher = hashlib.sha256()
+    async with get_http_client().stream("GET", url) as r:
         r.raise_for_status()
-        return r.content
+        async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+            buf.write(chunk)
+            hasher.update(chunk)
+    buf.seek(0)
+    return buf, hasher.hexdigest()
 
-def _sha256_bytes(data: bytes) -> str:
-    return hashlib.sha256(data).hexdigest()
+def _extract_text_cached(pdf: BinaryIO, pdf_hash: str) -> str:
+    namespace = f"{EXTRACTION_TOOL}-{EXTRACTION_TOOL_VERSION}"
+    text = cache.get_text(pdf_hash, namespace)
+    if text is None:
+        text = extract_text(pdf)  # \r is dropped by _normalize_text
+        cache.put_text(pdf_hash, namespace, text)
+    return text
 
-def _extract_text_from_pdf(pdf_bytes: bytes) -> str:
-    reader = PdfReader(io.BytesIO(pdf_bytes))
-    pages = []
-    for p in reader.pages:
-        try:
-            pages.append(p.extract_text() or "")
-        except Exception:
-            pages.append("")
-    return "\n\n".join(pages).replace("\r","")
+_RE_DEHYPHEN = re.compile(r"-\s*\n\s*")
+_RE_NEWLINE = re.compile(r"\s*\n\s*")
+_RE_WS = re.compile(r"\s+")
+_STRIP_CHARS = str.maketrans("", "", "\u00AD\r")  # soft hyphens, carriage returns
 
 def _normalize_text(text: str) -> str:
-    t = unicodedata.normalize("NFKC", text).replace("\u00AD","")  # drop soft hyphens
-    t = re.sub(r"-\s*\n\s*", "", t)    # de-hyphenate across newlines
-    t = re.sub(r"\s*\n\s*", " ", t)    # join lines
-    t = re.sub(r"\s+", " ", t).strip() # collapse spaces
+    if text.isascii():
+        # common case: NFKC can't change pure ASCII and there are no soft hyphens
+        t = text.translate(_STRIP_CHARS) if "\r" in text else text
+    else:
+        t = unicodedata.normalize("NFKC", text).translate(_STRIP_CHARS)
+    t = _RE_DEHYPHEN.sub("", t)     # de-hyphenate across newlines
+    t = _RE_NEWLINE.sub(" ", t)     # join lines
+    t = _RE_WS.sub(" ", t).strip()  # collapse spaces
     return t
 
-def _chunk_text(s: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> List[str]:
-    if len(s) <= max_chars:
-        return [s]
-    return [s[i:i+max_chars] for i in range(0, len(s), max_chars)]
+_META_FIELDS = ("venue", "year", "doi", "arxiv_id", "url", "pdf_url")
+# keep the header inside PROMPT_OVERHEAD_TOKENS: large collaborations list thousands of authors
+PROMPT_MAX_AUTHORS = 30
+PROMPT_MAX_META_CHARS = 300
 
-def _load_system_prompt() -> str:
-    with open(PROMPT_PATH, "r", encoding="utf-8") as f:
-        return f.read()
+def _meta_value(value: Any) -> str:
+    return str(value if value is not None else "")[:PROMPT_MAX_META_CHARS]
+
+def _authors_line(authors: List[str]) -> str:
+    line = ", ".join(authors[:PROMPT_MAX_AUTHORS])
+    if len(authors) > PROMPT_MAX_AUTHORS:
+        line += f", et al. ({len(authors)} authors)"
+    return line[: PROMPT_MAX_META_CHARS * 4]
 
 def _make_user_prompt(meta: Dict[str, Any], text: str) -> str:
-    return (
-        "Paper metadata:\n"
-        f"title: {meta.get('title','')}\n"
-        f"authors: {', '.join(meta.get('authors',[]))}\n"
-        f"venue: {meta.get('venue','')}\n"
-        f"year: {meta.get('year','')}\n"
-        f"doi: {meta.get('doi','')}\n"
-        f"arxiv_id: {meta.get('arxiv_id','')}\n"
-        f"url: {meta.get('url','')}\n"
-        f"pdf_url: {meta.get('pdf_url','')}\n\n"
-        "Paper text (concatenated, normalized):\n"
-        f"{text}\n\n"
-        "Return ONLY the JSON per the required schema."
+    parts = [
+        "Paper metadata:",
+        f"title: {_meta_value(meta.get('title',''))}",
+        f"authors: {_authors_line(meta.get('authors') or [])}",
+    ]
+    parts += [f"{k}: {_meta_value(meta.get(k,''))}" for k in _META_FIELDS]
+    parts += ["", "Paper text (concatenated, normalized):", text, "", "Return ONLY the JSON per the required schema."]
+    return "\n".join(parts)
+
+def _build_input(meta: Dict[str, Any], text: str) -> List[Dict[str, str]]:
+    return [
+        {"role":"system","content":_SYSTEM_PROMPT},
+        {"role":"user","content":_make_user_prompt(meta, text)},
+    ]
+
+# JSON mode: the model can only emit one valid JSON object, so no repair step
+JSON_OUTPUT_FORMAT = {"format": {"type": "json_object"}}
+
+def _is_retryable(e: Exception) -> bool:
+    if isinstance(e, APIConnectionError):
+        return True
+    return isinstance(e, APIStatusError) and (e.status_code == 429 or e.status_code >= 500)
+
+async def _create_response(input: List[Dict[str, str]], **kwargs):
+    est = estimate_tokens("".join(m["content"] for m in input), MAX_OUTPUT_TOKENS)
+    for attempt in range(MAX_RETRIES + 1):
+        await rate_limiter.acquire(est)
+        try:
+            return await client.responses.create(
+                input=input, max_output_tokens=MAX_OUTPUT_TOKENS, **kwargs
+            )
+        except Exception as e:
+            if attempt == MAX_RETRIES or not _is_retryable(e):
+                raise
+            # exponential backoff with full jitter
+            await asyncio.sleep(random.uniform(0, min(60, 2 ** attempt)))
+
+def _summary_cache_key(text_hash: str) -> str:
+    return hashlib.sha256(f"{text_hash}|{SUMMARY_MODEL}|{SUMMARY_PROMPT_VERSION}".encode("utf-8")).hexdigest()
+
+def _get_cached_summary(text_hash: Optional[str]) -> Optional[str]:
+    if not text_hash:
+        return None
+    with Session(engine) as session:
+        row = session.get(SummaryCache, _summary_cache_key(text_hash))
+        return row.summary_json if row else None
+
+def _put_cached_summary(text_hash: Optional[str], summary_json: str) -> None:
+    if not text_hash:
+        return
+    # ON CONFLICT: a concurrent writer of the same text hash must not fail the caller
+    stmt = (
+        dialect_insert(SummaryCache)
+        .values(
+            key=_summary_cache_key(text_hash),
+            summary_json=summary_json,
+            created_at=datetime.now(timezone.utc),
+        )
+        .on_conflict_do_nothing(index_elements=["key"])
     )
+    with Session(engine) as session:
+        session.exec(stmt)
+        session.commit()
 
 class SummarizationResult(BaseModel):
     summary_text: str           # JSON string (as returned by model)
@@ -86,43 +175,178 @@ class SummarizationResult(BaseModel):
     summary_pdf_sha256: str
     extracted_text_sha256: Optional[str] = None
 
-async def summarize_pdf_url_to_json(pdf_url: str, meta: Dict[str, Any]) -> SummarizationResult:
-    # 1) Download + hash
-    pdf_bytes = await _download_pdf(pdf_url)
-    pdf_hash = _sha256_bytes(pdf_bytes)
+def _get_stored_summary(pdf_hash: str) -> Optional[SummarizationResult]:
+    with Session(engine) as session:
+        row = session.exec(
+            select(Summary)
+            .where(Summary.summary_pdf_sha256 == pdf_hash)
+            .where(Summary.summary_model == SUMMARY_MODEL)
+            .where(Summary.summary_prompt_version == SUMMARY_PROMPT_VERSION)
+        ).first()
+    if row is None:
+        return None
+    return SummarizationResult(
+        summary_text=row.summary_json,
+        summary_model=row.summary_model,
+        summary_updated_at=row.created_at,
+        summary_pdf_sha256=row.summary_pdf_sha256,
+        extracted_text_sha256=row.extracted_text_sha256,
+    )
+
+def _store_summary(res: SummarizationResult) -> None:
+    stmt = (
+        dialect_insert(Summary)
+        .values(
+            summary_pdf_sha256=res.summary_pdf_sha256,
+            summary_model=res.summary_model,
+            summary_prompt_version=SUMMARY_PROMPT_VERSION,
+            summary_json=res.summary_text,
+            extracted_text_sha256=res.extracted_text_sha256,
+            created_at=res.summary_updated_at,
+        )
+        .on_conflict_do_nothing(
+            index_elements=["summary_pdf_sha256", "summary_model", "summary_prompt_version"]
+        )
+    )
+    with Session(engine) as session:
+        session.exec(stmt)
+        session.commit()
 
-    # 2) Extract + normalize
-    raw_text = _extract_text_from_pdf(pdf_bytes)
-    norm_text = _normalize_text(raw_text)
+class PreparedText(BaseModel):
+    pdf_sha256: str
+    text: str                   # normalized text, ready for the prompt
+    text_sha256: Optional[str] = None
+    summary: Optional[SummarizationResult] = None  # set when this PDF was already summarized
+
+# Per-process LRU of finished summaries keyed by PDF sha256. Model and prompt are
+# fixed for the process lifetime, so the PDF hash alone identifies the result.
+SUMMARY_LRU_SIZE = int(os.getenv("SUMMARY_LRU_SIZE", "512"))
+_summary_lru: "OrderedDict[str, SummarizationResult]" = OrderedDict()
+
+def _lru_get(pdf_hash: str) -> Optional[SummarizationResult]:
+    res = _summary_lru.get(pdf_hash)
+    if res is not None:
+        _summary_lru.move_to_end(pdf_hash)
+    return res
+
+def _lru_put(pdf_hash: str, res: SummarizationResult) -> None:
+    _summary_lru[pdf_hash] = res
+    _summary_lru.move_to_end(pdf_hash)
+    while len(_summary_lru) > SUMMARY_LRU_SIZE:
+        _summary_lru.popitem(last=False)
+
+# Loaded lazily and cached only on success: tiktoken fetches its BPE file on first
+# use, and a transient failure there shouldn't pin the char estimate for good.
+_encoding = None
+_encoding_failed_at: Optional[float] = None
+ENCODING_RETRY_SECONDS = 300
+_token_budget: Optional[int] = None  # fixed once the encoding is available
+
+def _get_encoding():
+    global _encoding, _encoding_failed_at
+    if _encoding is not None or tiktoken is None:
+        return _encoding
+    if _encoding_failed_at is not None and time.monotonic() - _encoding_failed_at < ENCODING_RETRY_SECONDS:
+        return None
+    try:
+        _encoding = tiktoken.encoding_for_model(SUMMARY_MODEL)
+    except Exception as e:  # unknown model or BPE file not downloadable
+        _encoding_failed_at = time.monotonic()
+        print(f"[summarizer] tiktoken unavailable, using char estimate: {e}")
+    return _encoding
+
+def _text_token_budget() -> int:
+    global _token_budget
+    if _token_budget is not None:
+        return _token_budget
+    reserve = SUMMARY_CONTEXT_TOKENS - MAX_OUTPUT_TOKENS - PROMPT_OVERHEAD_TOKENS
+    enc = _get_encoding()
+    if enc is None:
+        return reserve - len(_SYSTEM_PROMPT) // 4
+    # the system prompt is fixed per process: tokenize it once
+    _token_budget = reserve - len(enc.encode(_SYSTEM_PROMPT))
+    return _token_budget
+
+def _fit_to_context(text: str) -> str:
+    """Trim the paper text to the model's token budget so the request fits the context window."""
+    budget = _text_token_budget()
+    if text.isascii() and len(text) <= budget:
+        return text  # every ASCII char is at most one token
+    enc = _get_encoding()
+    if enc is None:
+        return text[: budget * 4]
+    tokens = enc.encode(text, disallowed_special=())
+    return text if len(tokens) <= budget else enc.decode(tokens[:budget])
+
+def _extract_and_normalize(pdf: BinaryIO, pdf_hash: str) -> Tuple[str, Optional[str]]:
+    """CPU-bound part of preparation (parse, normalize, hash); run off the event loop."""
+    raw_text = _extract_text_cached(pdf, pdf_hash)
+    norm_text = _fit_to_context(_normalize_text(raw_text))
     text_hash = hashlib.sha256(norm_text.encode("utf-8")).hexdigest() if norm_text else None
+    return norm_text, text_hash
 
-    # 3) Chunk (single-request merge for now)
-    chunks = _chunk_text(norm_text)
-    combined_text = "\n\n".join(chunks)
-
-    # 4) LLM call
-    system_prompt = _load_system_prompt()
-    user_prompt = _make_user_prompt(meta, combined_text)
-
-    resp = client.responses.create(
-        model=SUMMARY_MODEL,
-        input=[
-            {"role":"system","content":system_prompt},
-            {"role":"user","content":user_prompt},
-        ],
-        temperature=0.2,
-    )
-    output_text = resp.output_text.strip()
+# In-flight work by key ("url:<normalized url>" or "pdf:<sha256>"): concurrent callers
+# for the same paper await one task instead of each downloading/calling the LLM.
+_inflight: Dict[str, asyncio.Task] = {}
+T = TypeVar("T")
 
-    # 5) Be tolerant if model returns extra text around JSON
-    first = output_text.find("{")
-    last = output_text.rfind("}")
-    json_text = output_text[first:last+1] if first != -1 and last != -1 else "{}"
+async def _coalesced(key: str, make_coro: Callable[[], Awaitable[T]]) -> T:
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(make_coro())
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None) if _inflight.get(key) is t else None)
+    # shield: one caller being cancelled must not cancel the shared work
+    return await asyncio.shield(task)
 
-    return SummarizationResult(
-        summary_text=json_text,
+async def prepare_pdf_text(pdf_url: str) -> PreparedText:
+    return await _coalesced(f"url:{_normalize_pdf_url(pdf_url)}", lambda: _prepare_pdf_text(pdf_url))
+
+async def _prepare_pdf_text(pdf_url: str) -> PreparedText:
+    # 1) Download + hash
+    pdf, pdf_hash = await _download_pdf(pdf_url)
+    # LRU first, then the DB (shared across workers/processes); DB calls go to a
+    # thread like the rest of the blocking work so the event loop keeps running
+    cached = _lru_get(pdf_hash) or await asyncio.to_thread(_get_stored_summary, pdf_hash)
+    if cached is not None:
+        _lru_put(pdf_hash, cached)
+        return PreparedText(pdf_sha256=pdf_hash, text="", summary=cached)
+
+    # 2) Extract + normalize in a worker thread
+    norm_text, text_hash = await asyncio.to_thread(_extract_and_normalize, pdf, pdf_hash)
+
+    # single request per paper: the normalized text, trimmed to the context window
+    return PreparedText(pdf_sha256=pdf_hash, text=norm_text, text_sha256=text_hash)
+
+async def summarize_prepared(prepared: PreparedText, meta: Dict[str, Any]) -> SummarizationResult:
+    if prepared.summary is not None:
+        return prepared.summary
+    return await _coalesced(f"pdf:{prepared.pdf_sha256}", lambda: _summarize_text(prepared, meta))
+
+async def _summarize_text(prepared: PreparedText, meta: Dict[str, Any]) -> SummarizationResult:
+    # 4) Same text + model + prompt already summarized -> reuse it
+    summary_text = await asyncio.to_thread(_get_cached_summary, prepared.text_sha256)
+    if summary_text is None:
+        # 5) LLM call
+        resp = await _create_response(
+            model=SUMMARY_MODEL,
+            input=_build_input(meta, prepared.text),
+            temperature=0,
+            text=JSON_OUTPUT_FORMAT,
+        )
+        if resp.status == "incomplete":
+            # cut off mid-object (e.g. max_output_tokens); don't cache it
+            raise RuntimeError(f"summary incomplete: {resp.incomplete_details}")
+        summary_text = resp.output_text
+        await asyncio.to_thread(_put_cached_summary, prepared.text_sha256, summary_text)
+
+    res = SummarizationResult(
+        summary_text=summary_text,
         summary_model=SUMMARY_MODEL,
-        summary_updated_at=datetime.utcnow(),
-        summary_pdf_sha256=pdf_hash,
-        extracted_text_sha256=text_hash,
+        summary_updated_at=datetime.now(timezone.utc),
+        summary_pdf_sha256=prepared.pdf_sha256,
+        extracted_text_sha256=prepared.text_sha256,
     )
+    await asyncio.to_thread(_store_summary, res)
+    _lru_put(prepared.pdf_sha256, res)
+    return res
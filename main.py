@@ -2,22 +2,28 @@
 # FastAPI routes
 
 from fastapi import FastAPI, Request, HTTPException, Depends, BackgroundTasks, Query
-import asyncio, anyio
+import asyncio, anyio, functools, time
+from contextlib import asynccontextmanager
 from app.summarize_runner import summarize_missing_papers
-from datetime import datetime, timedelta
+from app.batch_summarizer import SUBMIT_MAX_PAPERS, submit_summary_batch, poll_summary_batches
+from datetime import datetime, timedelta, timezone
 from sqlmodel import Session, select
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import selectinload
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import HTMLResponse, RedirectResponse
+from jinja2 import FileSystemBytecodeCache
+from fastapi.responses import HTMLResponse, ORJSONResponse, RedirectResponse
 from starlette.middleware.sessions import SessionMiddleware
 from authlib.integrations.starlette_client import OAuth
 from dotenv import load_dotenv
 import os
 
 from app.arxiv import fetch_arxiv_papers
-from app.db import init_db, save_papers, engine
-from app.models import ArxivPaper, User, Bookmark, Vote, UserSettings
+from app.db import init_db, save_papers, get_session, dialect_insert
+from app.http_client import close_http_client
+from app.pdf_extract import shutdown_page_pool
+from app.models import ArxivPaper, PaperListItem, User, Bookmark, Vote, UserSettings
 
 # --- load env ---
 load_dotenv()
@@ -26,10 +32,30 @@ SESSION_SECRET = os.getenv("SESSION_SECRET", "dev-change-me")
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # shutdown (also on --reload): close pooled connections, stop PDF worker processes
+    await close_http_client()
+    shutdown_page_pool()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)  # orjson encodes datetimes natively
 app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET, same_site="lax")
 
 templates = Jinja2Templates(directory="templates")
+if os.getenv("ENV") == "prod":
+    # templates don't change under a running deploy: skip the per-render stat()
+    # and keep compiled bytecode across restarts
+    templates.env.auto_reload = False
+    JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR")
+    if JINJA_CACHE_DIR:
+        os.makedirs(JINJA_CACHE_DIR, mode=0o700, exist_ok=True)
+        templates.env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+    else:
+        # no path: Jinja creates and checks a private per-user dir under the temp dir
+        templates.env.bytecode_cache = FileSystemBytecodeCache()
 init_db()
 
 # --- Google OAuth setup ---
@@ -75,7 +101,7 @@ async def logout(request: Request):
 
 # -- after Google callback, upsert the user --
 @app.get("/auth/callback")
-async def auth_callback(request: Request):
+async def auth_callback(request: Request, session: Session = Depends(get_session)):
     token = await oauth.google.authorize_access_token(request)
     userinfo = token.get("userinfo", {})
     u = {
@@ -86,13 +112,12 @@ async def auth_callback(request: Request):
     }
     request.session["user"] = u
     # upsert user
-    with Session(engine) as s:
-        dbu = s.get(User, u["sub"])
-        if dbu is None:
-            s.add(User(**u))
-        else:
-            dbu.email, dbu.name, dbu.picture = u["email"], u["name"], u["picture"]
-        s.commit()
+    dbu = session.get(User, u["sub"])
+    if dbu is None:
+        session.add(User(**u))
+    else:
+        dbu.email, dbu.name, dbu.picture = u["email"], u["name"], u["picture"]
+    session.commit()
     return RedirectResponse(url="/?login_success=1")
 
 
@@ -116,15 +141,14 @@ def require_user_sub(request: Request) -> str:
 
 # --- Bookmarks ---
 @app.get("/bookmarks", response_class=HTMLResponse)
-def my_bookmarks(request: Request, user_sub: str = Depends(require_user_sub)):
-    with Session(engine) as s:
-        papers = s.exec(
-            select(ArxivPaper)
-            .options(selectinload(ArxivPaper.categories))
-            .join(Bookmark, Bookmark.paper_id == ArxivPaper.id)
-            .where(Bookmark.user_sub == user_sub)  # <-- use the string directly
-            .order_by(ArxivPaper.published.desc())
-        ).all()
+def my_bookmarks(request: Request, user_sub: str = Depends(require_user_sub), session: Session = Depends(get_session)):
+    papers = session.exec(
+        select(ArxivPaper)
+        .options(selectinload(ArxivPaper.categories))
+        .join(Bookmark, Bookmark.paper_id == ArxivPaper.id)
+        .where(Bookmark.user_sub == user_sub)  # <-- use the string directly
+        .order_by(ArxivPaper.published.desc())
+    ).all()
 
     return templates.TemplateResponse(
         "papers.html",
@@ -140,151 +164,130 @@ def my_bookmarks(request: Request, user_sub: str = Depends(require_user_sub)):
 
 # ---- Bookmarks ----
 @app.get("/api/papers/{paper_id}/bookmarks")
-def get_personal_bookmark_state(paper_id: int, request: Request):
+def get_personal_bookmark_state(paper_id: int, request: Request, session: Session = Depends(get_session)):
     """Return 1 if current user bookmarked, else 0. For logged-out users, 0."""
     user = request.session.get("user")
     if not user:
         return {"mine": 0}
     sub = user["sub"]
-    with Session(engine) as session:
-        exists = session.exec(
-            select(Bookmark.id).where(
-                Bookmark.user_sub == sub, Bookmark.paper_id == paper_id
-            )
-        ).first()
-        return {"mine": 1 if exists else 0}
+    exists = session.exec(
+        select(Bookmark.id).where(
+            Bookmark.user_sub == sub, Bookmark.paper_id == paper_id
+        )
+    ).first()
+    return {"mine": 1 if exists else 0}
+
+
+def _ensure_user(session: Session, user: dict) -> None:
+    # the session user normally exists already (auth_callback); this is a no-op then
+    session.exec(
+        dialect_insert(User)
+        .values(
+            sub=user["sub"],
+            name=user.get("name"),
+            email=user.get("email"),
+            picture=user.get("picture"),
+        )
+        .on_conflict_do_nothing(index_elements=["sub"])
+    )
 
 
 @app.post("/api/papers/{paper_id}/bookmark")
-def add_bookmark(paper_id: int, request: Request):
-    sub = require_user_sub(request)
-    with Session(engine) as session:
-        # ensure paper exists
-        ok = session.exec(
-            select(ArxivPaper.id).where(ArxivPaper.id == paper_id)
-        ).first()
-        if not ok:
-            raise HTTPException(404, "Paper not found")
-
-        # ensure user exists
-        u = session.get(User, sub)
-        if not u:
-            u = User(
-                sub=sub,
-                name=user.get("name"),
-                email=user.get("email"),
-                picture=user.get("picture"),
-            )
-            session.add(u)
-            session.commit()
-
-        # insert if not exists
-        exists = session.exec(
-            select(Bookmark.id).where(
-                Bookmark.user_sub == sub, Bookmark.paper_id == paper_id
-            )
-        ).first()
-        if not exists:
-            session.add(Bookmark(user_sub=sub, paper_id=paper_id))
-            session.commit()
-        return {"ok": True}
+def add_bookmark(paper_id: int, request: Request, session: Session = Depends(get_session)):
+    user = require_user_obj(request)
+    _ensure_user(session, user)
+    try:
+        # the paper_id foreign key stands in for a separate existence check
+        session.exec(
+            dialect_insert(Bookmark)
+            .values(user_sub=user["sub"], paper_id=paper_id)
+            .on_conflict_do_nothing(index_elements=["user_sub", "paper_id"])
+        )
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(404, "Paper not found")
+    return {"ok": True}
 
 
 @app.delete("/api/papers/{paper_id}/bookmark")
-def remove_bookmark(paper_id: int, request: Request):
+def remove_bookmark(paper_id: int, request: Request, session: Session = Depends(get_session)):
     sub = require_user_sub(request)
-    with Session(engine) as session:
-        row = session.exec(
-            select(Bookmark).where(
-                Bookmark.user_sub == sub, Bookmark.paper_id == paper_id
-            )
-        ).first()
-        if row:
-            session.delete(row)
-            session.commit()
-        return {"ok": True}
+    row = session.exec(
+        select(Bookmark).where(
+            Bookmark.user_sub == sub, Bookmark.paper_id == paper_id
+        )
+    ).first()
+    if row:
+        session.delete(row)
+        session.commit()
+    return {"ok": True}
 
 
 # ---- Scores / votes ----
+def _paper_score(session: Session, paper_id: int) -> int:
+    # aggregate in SQL instead of pulling every vote row
+    return session.exec(
+        select(func.coalesce(func.sum(Vote.value), 0)).where(Vote.paper_id == paper_id)
+    ).one()
+
+
 @app.get("/api/papers/{paper_id}/score")
-def get_paper_score(paper_id: int):
-    with Session(engine) as session:
-        total = session.exec(select(Vote.value).where(Vote.paper_id == paper_id)).all()
-        score = sum(total) if total else 0
-        return {"score": score}
+def get_paper_score(paper_id: int, session: Session = Depends(get_session)):
+    return {"score": _paper_score(session, paper_id)}
 
 
 @app.post("/api/papers/{paper_id}/vote")
-def vote_paper(paper_id: int, body: dict, request: Request):
+def vote_paper(paper_id: int, body: dict, request: Request, session: Session = Depends(get_session)):
     sub = require_user_sub(request)  # get logged-in user's sub
     value = int(body.get("value", 0))  # read from request body
 
     if value not in (-1, 0, 1):
         raise HTTPException(400, "value must be -1 or 1")
 
-    with Session(engine) as session:
-        # ensure paper exists
-        ok = session.exec(
-            select(ArxivPaper.id).where(ArxivPaper.id == paper_id)
-        ).first()
-        if not ok:
-            raise HTTPException(404, "Paper not found")
-
-        # ensure user exists
-        u = session.get(User, sub)
-        if not u:
-            # minimal upsert in case user row not created yet
-            u = User(
-                sub=sub,
-                name=None,  # You can fetch from session if needed
-                email=None,
-                picture=None,
+    _ensure_user(session, require_user_obj(request))
+    try:
+        stmt = dialect_insert(Vote).values(user_sub=sub, paper_id=paper_id, value=value)
+        session.exec(
+            stmt.on_conflict_do_update(
+                index_elements=["user_sub", "paper_id"],
+                set_={"value": stmt.excluded.value},
             )
-            session.add(u)
-            session.commit()
-
-        # upsert vote (unique on user_sub, paper_id)
-        existing = session.exec(
-            select(Vote).where(Vote.user_sub == sub, Vote.paper_id == paper_id)
-        ).first()
-        if existing:
-            existing.value = value
-        else:
-            session.add(Vote(user_sub=sub, paper_id=paper_id, value=value))
+        )
         session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(404, "Paper not found")
 
-        # return new score
-        total = session.exec(select(Vote.value).where(Vote.paper_id == paper_id)).all()
-        return {"score": sum(total) if total else 0}
+    # return new score
+    return {"score": _paper_score(session, paper_id)}
 
 
 @app.get("/api/user/settings")
-def get_user_settings(request: Request):
+def get_user_settings(request: Request, session: Session = Depends(get_session)):
     sub = require_user_sub(request)
-    with Session(engine) as session:
-        s = session.get(UserSettings, sub)
-        if not s:
-            return {"user_sub": sub, "prefs": {}, "updated_at": None}
-        return {"user_sub": s.user_sub, "prefs": s.prefs, "updated_at": s.updated_at}
+    s = session.get(UserSettings, sub)
+    if not s:
+        return {"user_sub": sub, "prefs": {}, "updated_at": None}
+    return {"user_sub": s.user_sub, "prefs": s.prefs, "updated_at": s.updated_at}
 
 
 @app.post("/api/user/settings")
-def upsert_user_settings(body: dict, request: Request):
+def upsert_user_settings(body: dict, request: Request, session: Session = Depends(get_session)):
     sub = require_user_sub(request)
     prefs = body.get("prefs") or {}
     if not isinstance(prefs, dict):
         raise HTTPException(400, "prefs must be an object")
 
-    with Session(engine) as session:
-        s = session.get(UserSettings, sub)
-        if s:
-            s.prefs = prefs
-            s.updated_at = datetime.utcnow()
-        else:
-            s = UserSettings(user_sub=sub, prefs=prefs)
-            session.add(s)
-        session.commit()
-        return {"ok": True}
+    s = session.get(UserSettings, sub)
+    if s:
+        s.prefs = prefs
+        s.updated_at = datetime.now(timezone.utc)
+    else:
+        s = UserSettings(user_sub=sub, prefs=prefs)
+        session.add(s)
+    session.commit()
+    return {"ok": True}
 
 
 daily_lock = asyncio.Lock()
@@ -305,12 +308,18 @@ async def run_daily_pipeline(start: str, end: str):
         await summarize_missing_papers()
 
 
+@functools.lru_cache(maxsize=1)
+def _daily_range(minute: int) -> tuple[str, str]:
+    # keyed by the current minute so the dates are formatted once per minute;
+    # the feed itself is cached in fetch_arxiv_papers
+    today = datetime.now(timezone.utc)
+    yesterday = today - timedelta(days=3)
+    return yesterday.strftime("%Y%m%d0000"), today.strftime("%Y%m%d2359")
+
+
 @app.get("/arxiv/daily")
 async def get_daily_arxiv(background: BackgroundTasks):
-    today = datetime.utcnow()
-    yesterday = today - timedelta(days=3)
-    start = yesterday.strftime("%Y%m%d0000")
-    end = today.strftime("%Y%m%d2359")
+    start, end = _daily_range(int(time.time() // 60))
 
     # parsed = await fetch_arxiv_papers(start, end)
     # save_papers(parsed)
@@ -331,30 +340,66 @@ async def cron_summarize(limit: int = Query(10, ge=1, le=100)):
     return {"summaries_written": updated, "limit": limit}
 
 
-@app.get("/arxiv/show")
-def show_papers():
-    with Session(engine) as session:
-        stmt = select(ArxivPaper).order_by(ArxivPaper.published.desc()).limit(10)
-        papers = session.exec(stmt).all()
-        return papers
+# Bulk summarization via OpenAI Batch API (backfills); poll periodically from cron
+async def run_summary_batch(limit: int):
+    # papers are claimed in the DB first, so overlapping runs get disjoint sets
+    result = await submit_summary_batch(limit=limit)
+    print(f"[run_summary_batch] {result}")
 
 
-@app.get("/", response_class=HTMLResponse)
-def html_view(request: Request):
-    with Session(engine) as session:
-        stmt = select(ArxivPaper).order_by(ArxivPaper.published.desc()).limit(50)
-        papers = session.exec(stmt).all()
-        user = request.session.get("user")
-        return templates.TemplateResponse(
-            "papers.html",
-            {
-                "request": request,
-                "papers": papers,
-                "user": request.session.get("user"),
-                "active_view": "all",
-                "GA_MEASUREMENT_ID": GA_MEASUREMENT_ID,
-            },
+@app.post("/cron/summarize/batch")
+async def cron_summarize_batch(
+    background: BackgroundTasks, limit: int = Query(500, ge=1, le=SUBMIT_MAX_PAPERS)
+):
+    # downloads/extraction can take a long time: run after the response is sent
+    background.add_task(run_summary_batch, limit)
+    return {"scheduled": True, "limit": limit}
+
+
+@app.post("/cron/summarize/batch/poll")
+async def cron_poll_summary_batches():
+    return await poll_summary_batches()
+
+
+@app.get("/arxiv/show", response_model=list[PaperListItem])
+def show_papers(session: Session = Depends(get_session)):
+    # only the list columns leave the database
+    stmt = (
+        select(
+            ArxivPaper.id,
+            ArxivPaper.arxiv_id,
+            ArxivPaper.title,
+            ArxivPaper.authors,
+            ArxivPaper.published,
+            ArxivPaper.url,
         )
+        .order_by(ArxivPaper.published.desc())
+        .limit(10)
+    )
+    return [row._mapping for row in session.exec(stmt).all()]
+
+
+@app.get("/", response_class=HTMLResponse)
+def html_view(request: Request, session: Session = Depends(get_session)):
+    # template iterates paper.categories: load them in one extra query, not one per paper
+    stmt = (
+        select(ArxivPaper)
+        .options(selectinload(ArxivPaper.categories))
+        .order_by(ArxivPaper.published.desc())
+        .limit(50)
+    )
+    papers = session.exec(stmt).all()
+    user = request.session.get("user")
+    return templates.TemplateResponse(
+        "papers.html",
+        {
+            "request": request,
+            "papers": papers,
+            "user": request.session.get("user"),
+            "active_view": "all",
+            "GA_MEASUREMENT_ID": GA_MEASUREMENT_ID,
+        },
+    )
 
 
 @app.get("/feedback", response_class=HTMLResponse)